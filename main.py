@@ -8,12 +8,16 @@ from fastmcp.server.auth.providers.bearer import BearerAuthProvider, RSAKeyPair
 from mcp import ErrorData, McpError
 from mcp.server.auth.provider import AccessToken
 from mcp.types import TextContent, ImageContent, INVALID_PARAMS, INTERNAL_ERROR
-from pydantic import BaseModel, Field, AnyUrl
-import markdownify
-import httpx
-import readabilipy
+from pydantic import BaseModel, ConfigDict, Field, AnyUrl
+import html2text
+import aiohttp
+from readability import Document as ReadabilityDocument
+import lxml.html
 import re
+import functools
 import inspect
+import time
+from urllib.parse import quote_plus
 import cv2
 import base64
 import datetime
@@ -22,6 +26,24 @@ import zeep.cache
 zeep.cache.SqliteCache = zeep.cache.InMemoryCache
 from textwrap import dedent
 
+# Optional C-speed JSON serializer for tool metadata dumps.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional SIMD base64 for multi-MB snapshot payloads.
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+def _b64encode(data) -> str:
+    """Encode bytes-like data to base64 text, via SIMD pybase64 when available."""
+    if pybase64 is not None:
+        return pybase64.b64encode(data).decode("ascii")
+    return base64.b64encode(data).decode("ascii")
+
 # --- Load environment variables ---
 load_dotenv()
 
@@ -37,23 +59,79 @@ class SimpleBearerAuthProvider(BearerAuthProvider):
         k = RSAKeyPair.generate()
         super().__init__(public_key=k.public_key, jwks_uri=None, issuer=None, audience=None)
         self.token = token
+        # Built once; every authenticated call returns this same instance.
+        self._access_token = AccessToken(
+            token=token,
+            client_id="puch-client",
+            scopes=["*"],
+            expires_at=None,
+        )
 
     async def load_access_token(self, token: str) -> AccessToken | None:
         if token == self.token:
-            return AccessToken(
-                token=token,
-                client_id="puch-client",
-                scopes=["*"],
-                expires_at=None,
-            )
+            return self._access_token
         return None
 
 # --- Rich Tool Description model ---
 class RichToolDescription(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     description: str
     use_when: str
     side_effects: str | None = None
 
+    def dump(self) -> str:
+        if orjson is not None:
+            return orjson.dumps(self.model_dump()).decode()
+        return self.model_dump_json()
+
+# Optional search client: returns parsed results without a SERP scrape.
+try:
+    from duckduckgo_search import AsyncDDGS
+except ImportError:
+    AsyncDDGS = None
+
+# --- Shared HTTP session ---
+# One pooled session for the whole process: keep-alive connections skip the
+# TCP+TLS handshake that a per-call client pays every time. Created lazily so
+# the connector binds to the running event loop.
+_SESSION: aiohttp.ClientSession | None = None
+
+def _http_session() -> aiohttp.ClientSession:
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+            # Separate connect/read budgets: a dead host fails in 5s instead
+            # of eating the whole 30s total window.
+            timeout=aiohttp.ClientTimeout(total=30, connect=5, sock_read=25),
+            # Ask for compressed bodies (brotli handled via the Brotli
+            # package); aiohttp decompresses transparently.
+            headers={
+                "Accept-Encoding": "gzip, deflate, br",
+                "User-Agent": Fetch.USER_AGENT,
+            },
+        )
+    return _SESSION
+
+async def _close_http_session() -> None:
+    """Shutdown counterpart of _http_session, called when the server stops."""
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+# --- Fetch cache ---
+# Readability extraction dominates fetch cost, so recently fetched URLs are
+# served from a small TTL cache instead of being re-fetched and re-parsed.
+_FETCH_CACHE: dict[tuple[str, bool], tuple[float, tuple[str, str]]] = {}
+_FETCH_CACHE_TTL = 300  # seconds
+_FETCH_CACHE_MAX = 256
+
+# Cap returned page content: multi-MB pages blow past any LLM context budget
+# and cost memory for nothing.
+MAX_CONTENT_CHARS = 20_000
+
 # --- Fetch Utility Class ---
 class Fetch:
     USER_AGENT = "Puch/1.0 (Autonomous)"
@@ -65,56 +143,84 @@ class Fetch:
         user_agent: str,
         force_raw: bool = False,
     ) -> tuple[str, str]:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    url,
-                    follow_redirects=True,
-                    headers={"User-Agent": user_agent},
-                    timeout=30,
-                )
-            except httpx.HTTPError as e:
-                raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url}: {e!r}"))
-
-            if response.status_code >= 400:
-                raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url} - status code {response.status_code}"))
+        key = (url, force_raw)
+        cached = _FETCH_CACHE.get(key)
+        if cached is not None and time.monotonic() - cached[0] < _FETCH_CACHE_TTL:
+            return cached[1]
 
-            page_raw = response.text
-
-        content_type = response.headers.get("content-type", "")
-        is_page_html = "text/html" in content_type
-
-        if is_page_html and not force_raw:
-            return cls.extract_content_from_html(page_raw), ""
-
-        return (
-            page_raw,
-            f"Content type {content_type} cannot be simplified to markdown, but here is the raw content:\n",
-        )
+        try:
+            async with _http_session().get(url, headers={"User-Agent": user_agent}) as response:
+                if response.status >= 400:
+                    raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url} - status code {response.status}"))
+
+                # Headers arrive before the body, so branch on content-type
+                # first and only decode to str when the raw path needs it.
+                content_type = response.headers.get("content-type", "")
+                is_page_html = "text/html" in content_type
+
+                if is_page_html and not force_raw:
+                    # Pass raw bytes so lxml handles encoding detection itself.
+                    result = (cls.extract_content_from_html(await response.read()), "")
+                else:
+                    page_bytes = await response.read()
+                    result = (
+                        page_bytes.decode(response.charset or "utf-8", errors="replace"),
+                        f"Content type {content_type} cannot be simplified to markdown, but here is the raw content:\n",
+                    )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # aiohttp raises bare TimeoutError when the total timeout budget
+            # elapses; only connect-phase timeouts subclass ClientError.
+            raise McpError(ErrorData(code=INTERNAL_ERROR, message=f"Failed to fetch {url}: {e!r}"))
+
+        content, prefix = result
+        if len(content) > MAX_CONTENT_CHARS:
+            result = (content[:MAX_CONTENT_CHARS].rstrip() + "\n…[truncated]", prefix)
+
+        if len(_FETCH_CACHE) >= _FETCH_CACHE_MAX:
+            # Drop the oldest insertion to keep the cache bounded.
+            _FETCH_CACHE.pop(next(iter(_FETCH_CACHE)))
+        _FETCH_CACHE[key] = (time.monotonic(), result)
+        return result
 
     @staticmethod
-    def extract_content_from_html(html: str) -> str:
+    def extract_content_from_html(html: str | bytes) -> str:
         """Extract and convert HTML content to Markdown format."""
-        ret = readabilipy.simple_json.simple_json_from_html_string(html, use_readability=True)
-        if not ret or not ret.get("content"):
+        try:
+            content_html = ReadabilityDocument(html).summary(html_partial=True)
+        except Exception:
+            content_html = None
+        if not content_html:
             return "<error>Page failed to be simplified from HTML</error>"
-        content = markdownify.markdownify(ret["content"], heading_style=markdownify.ATX)
-        return content
+        # html2text walks the HTML tokens once; markdownify re-parsed the
+        # summary with BeautifulSoup for a second full DOM build.
+        converter = html2text.HTML2Text()
+        converter.body_width = 0
+        return converter.handle(content_html)
 
     @staticmethod
     async def google_search_links(query: str, num_results: int = 5) -> list[str]:
-        ddg_url = f"https://html.duckduckgo.com/html/?q={query.replace(' ', '+')}"
+        # Prefer the duckduckgo_search client: it returns parsed results
+        # directly, skipping the full SERP download and HTML parse.
+        if AsyncDDGS is not None:
+            try:
+                async with AsyncDDGS() as ddgs:
+                    results = await ddgs.atext(query, max_results=num_results)
+                links = [r["href"] for r in results or [] if r.get("href")]
+                if links:
+                    return links[:num_results]
+            except Exception:
+                pass  # fall back to scraping the HTML endpoint
+
+        ddg_url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
         links = []
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(ddg_url, headers={"User-Agent": Fetch.USER_AGENT})
-            if resp.status_code != 200:
+        async with _http_session().get(ddg_url) as resp:
+            if resp.status != 200:
                 return ["<error>Failed to perform search.</error>"]
+            page_bytes = await resp.read()
 
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(resp.text, "html.parser")
-        for a in soup.find_all("a", class_="result__a", href=True):
-            href = a["href"]
+        root = lxml.html.fromstring(page_bytes)
+        for href in root.xpath('//a[contains(concat(" ", normalize-space(@class), " "), " result__a ")]/@href'):
             if "http" in href:
                 links.append(href)
             if len(links) >= num_results:
@@ -152,12 +258,6 @@ async def about() -> dict:
 async def validate() -> str:
     return MY_NUMBER
 
-# --- Helper function for handling awaitables gracefully ---
-async def resolve_awaitable(obj):
-    if inspect.isawaitable(obj):
-        return await obj
-    return obj
-
 # --- Load Camera Credentials ---
 CAMERA_IP = os.getenv("CAMERA_IP")
 ONVIF_PORT = int(os.getenv("ONVIF_PORT", 8000))
@@ -178,100 +278,303 @@ class SmartCommandRequest(BaseModel):
     command: str
     params: dict | None = None
 
-# --- Smart Command Parser ---
-def parse_smart_command(user_text: str) -> dict | None:
-    t = user_text.lower().strip()
-
+# --- Command trigger phrases, in action-priority order ---
+_ACTION_PHRASES: dict[str, tuple[str, ...]] = {
     # Turn On triggers
-    turn_on_phrases = [
+    "turn_on": (
         "turn on", "switch on", "power on", "activate", "enable", "light up",
         "start", "boot up", "fire up", "initiate", "run", "begin", "wake up",
         "bring online", "turn my", "turn the", "switch my", "switch the",
         "make it on", "get it going", "launch", "kickstart", "ignite",
         "let there be light", "resume power", "switch it on", "turn this on",
         "plug in", "give power", "flip the switch", "power it up"
-    ]
-
+    ),
     # Turn Off triggers
-    turn_off_phrases = [
+    "turn_off": (
         "turn off", "switch off", "power off", "deactivate", "disable", "shut down",
         "stop", "cut off", "turn my", "turn the", "kill", "halt", "pause", "end",
         "put to sleep", "cut the power", "switch my", "switch the", "unplug",
         "remove power", "stop running", "power it down", "turn this off", "shut the",
         "flip the switch off", "dark mode", "kill the lights"
-    ]
-
+    ),
     # Set Temperature triggers
-    set_temp_phrases = [
+    "set_temperature": (
         "set temperature", "set thermostat", "change temperature", "adjust temperature",
         "temperature to", "thermostat to", "heat to", "cool to", "make it", "set it to",
         "increase temperature", "decrease temperature", "raise temp", "lower temp",
         "set degrees", "make it warmer", "make it colder", "chill to", "warm to",
         "set climate to", "adjust climate", "set ac to", "set heater to",
         "set the room temp", "bring temp to", "temp at", "set room to"
-    ]
-
+    ),
     # Status Check triggers
-    status_phrases = [
+    "get_status": (
         "status", "state", "is the", "check", "show", "tell me", "report",
         "how is", "current state", "what's the", "is my", "condition of", "give me status",
         "get status", "how's the", "is it working", "is it on", "is it off",
         "show me if", "are we online", "how's it going", "update me", "what's up with"
-    ]
-
+    ),
     # Reboot triggers
-    reboot_phrases = [
+    "reboot": (
         "reboot", "restart", "reset", "power cycle", "reload", "re initialize",
         "refresh", "boot again", "turn it off and on", "cycle power", "re launch",
         "hard reset", "soft reset", "re kick", "system restart", "system reboot",
         "reset cam", "reset device", "reset this", "reboot this", "refresh the"
-    ]
-
+    ),
     # Take Snapshot triggers
-    snapshot_phrases = [
+    "take_snapshot": (
         "snapshot", "picture", "photo", "image", "take a picture", "take photo",
         "capture", "grab image", "record still", "take snapshot", "show me the view",
         "take a shot", "snap a photo", "camera shot", "screen capture", "cam shot",
         "shoot", "snap it", "grab a frame", "freeze frame", "click a photo",
         "photograph", "take image", "see the camera", "view from", "what camera sees",
         "live view", "get me a shot", "look at camera", "show picture", "record image"
-    ]
-
-    # Detect action
-    action = None
-    if any(p in t for p in turn_on_phrases):
-        action = "turn_on"
-    elif any(p in t for p in turn_off_phrases):
-        action = "turn_off"
-    elif any(p in t for p in set_temp_phrases) or re.search(r"\bset .* to \d{2}\b", t):
-        action = "set_temperature"
-    elif any(p in t for p in status_phrases):
-        action = "get_status"
-    elif any(p in t for p in reboot_phrases):
-        action = "reboot"
-    elif any(p in t for p in snapshot_phrases):
-        action = "take_snapshot"
+    ),
+}
+
+# One compiled alternation per action, checked with .search() in priority
+# order: overlap-safe, so the fallback always agrees with the automaton path
+# (a fused-pattern finditer skips phrases overlapping an earlier match, e.g.
+# "start" inside "restart").
+_ACTION_RE: dict[str, re.Pattern] = {
+    action: re.compile("|".join(map(re.escape, phrases)))
+    for action, phrases in _ACTION_PHRASES.items()
+}
+# One fused pattern both signals set_temperature and captures the degrees,
+# so detection and extraction share a single scan.
+_SET_TEMP_RE = re.compile(r"(?:set|temperature|thermostat|heat|cool|warm|chill|make it|bring temp)\b[^\d]{0,30}(\d{2})\b")
+_TEMP_RE = re.compile(r"(\d{2})\b")
+
+# Action priority mirrors the original if/elif chain order.
+_ACTION_PRIORITY = {action: rank for rank, action in enumerate(_ACTION_PHRASES)}
+
+# Optional Aho-Corasick accelerator: every phrase goes into one automaton so a
+# single linear pass over the text finds all trigger matches at once.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+if ahocorasick is not None:
+    _ACTION_AUTOMATON = ahocorasick.Automaton()
+    for _action, _phrases in _ACTION_PHRASES.items():
+        for _phrase in _phrases:
+            if not _ACTION_AUTOMATON.exists(_phrase):
+                _ACTION_AUTOMATON.add_word(_phrase, _action)
+    _ACTION_AUTOMATON.make_automaton()
+else:
+    _ACTION_AUTOMATON = None
+
+def _detect_action(t: str, set_temp_hint: bool = False) -> str | None:
+    best = None
+    if _ACTION_AUTOMATON is not None:
+        for _, action in _ACTION_AUTOMATON.iter(t):
+            if best is None or _ACTION_PRIORITY[action] < _ACTION_PRIORITY[best]:
+                best = action
+    else:
+        for candidate, pattern in _ACTION_RE.items():
+            if pattern.search(t):
+                best = candidate
+                break
+    # A 'set ... to NN' style hint counts as a set_temperature trigger.
+    if set_temp_hint:
+        if best is None or _ACTION_PRIORITY[best] > _ACTION_PRIORITY["set_temperature"]:
+            best = "set_temperature"
+    return best
+
+# --- Smart Command Parser ---
+@functools.lru_cache(maxsize=256)
+def _parse_cached(t: str) -> tuple[str | None, str, int | None] | None:
+    """Parse a normalized command string into (device_id, action, temperature).
+
+    Results are memoized per unique text; the cache is cleared whenever the
+    device index changes. Only immutable values are cached so entries can be
+    shared safely across calls.
+    """
+    # One scan serves both set_temperature detection and degree extraction.
+    temp_match = _SET_TEMP_RE.search(t)
+
+    # Detect action (highest-priority matching action wins)
+    action = _detect_action(t, temp_match is not None)
 
     if not action:
         return None
 
-    # Match device by name or alias
+    # Match device by name or alias (longest match wins on both paths)
     device_id = None
-    for dev in _SMART_HOME_DEVICE_STORE.values():
-        if dev.name.lower() in t or any(alias in t for alias in dev.aliases):
-            device_id = dev.id
-            break
+    if _DEVICE_AUTOMATON is not None:
+        best_len = 0
+        for _, (name_len, dev_id) in _DEVICE_AUTOMATON.iter(t):
+            if name_len > best_len:
+                best_len, device_id = name_len, dev_id
+    elif _DEVICE_RE is not None:
+        best_len = 0
+        for m in _DEVICE_RE.finditer(t):
+            name = m.group()
+            if len(name) > best_len:
+                best_len, device_id = len(name), _DEVICE_NAME_TO_ID[name]
 
     # Extract temperature if needed
-    params: dict = {}
+    temperature = None
     if action == "set_temperature":
-        m = re.search(r"(\d{2})\b", t)
+        m = temp_match or _TEMP_RE.search(t)
         if m:
-            params["temperature"] = int(m.group(1))
+            temperature = int(m.group(1))
 
+    return (device_id, action, temperature)
+
+def parse_smart_command(user_text: str) -> dict | None:
+    parsed = _parse_cached(user_text.lower().strip())
+    if parsed is None:
+        return None
+    device_id, action, temperature = parsed
+    params: dict = {} if temperature is None else {"temperature": temperature}
     return {"device_id": device_id, "command": action, "params": params}
 
 
+# --- Camera connection cache ---
+# Building an ONVIFCamera plus its services costs several SOAP round-trips and
+# a WSDL parse, so the handles are built once per device and reused until a
+# command fails, at which point the entry is evicted and rebuilt.
+_CAM_CACHE: dict[str, dict] = {}
+_CAM_LOCK = asyncio.Lock()
+
+async def _onvif_result(ctx: dict, res):
+    """Await an ONVIF call result only when the client was probed as async."""
+    if ctx["is_async"]:
+        return await res
+    return res
+
+async def _get_cam(device_id: str) -> dict:
+    async with _CAM_LOCK:
+        ctx = _CAM_CACHE.get(device_id)
+        if ctx is not None:
+            return ctx
+
+        mycam = ONVIFCamera(CAMERA_IP, ONVIF_PORT, ONVIF_USER, ONVIF_PASS)
+        # The ONVIF wrapper is either fully sync or fully async per instance,
+        # so probe once here instead of reflecting on every call.
+        res = mycam.update_xaddrs()
+        is_async = inspect.isawaitable(res)
+        if is_async:
+            await res
+
+        async def resolve(obj):
+            return await obj if is_async else obj
+
+        # Both services are independent; create them concurrently so their
+        # SOAP round-trips overlap instead of running back to back.
+        media_service, devicemgmt = await asyncio.gather(
+            resolve(mycam.create_media_service()),
+            resolve(mycam.create_devicemgmt_service()),
+        )
+
+        profiles = await resolve(media_service.GetProfiles())
+        if not profiles:
+            raise McpError(ErrorData(code=INTERNAL_ERROR, message="No media profiles available on camera."))
+        token = profiles[0].token
+
+        uri_request = media_service.create_type('GetStreamUri')
+        uri_request.ProfileToken = token
+        uri_request.StreamSetup = {'Stream': 'RTP-Unicast', 'Transport': {'Protocol': 'RTSP'}}
+        uri_response = await resolve(media_service.GetStreamUri(uri_request))
+        stream_uri = uri_response.Uri
+
+        # Most cameras also expose an HTTP snapshot endpoint that serves a
+        # ready-encoded JPEG; remember it when available so snapshots can
+        # skip RTSP entirely.
+        snapshot_uri = None
+        try:
+            snap_request = media_service.create_type('GetSnapshotUri')
+            snap_request.ProfileToken = token
+            snap_response = await resolve(media_service.GetSnapshotUri(snap_request))
+            snapshot_uri = snap_response.Uri
+        except Exception:
+            pass
+        if ONVIF_USER and ONVIF_PASS:
+            # inject credentials into URI
+            parts = stream_uri.split('://', 1)
+            if len(parts) == 2:
+                stream_uri = f"{parts[0]}://{ONVIF_USER}:{ONVIF_PASS}@{parts[1]}"
+
+        ctx = {
+            "cam": mycam,
+            "media": media_service,
+            "devmgmt": devicemgmt,
+            "profile_token": token,
+            "stream_uri": stream_uri,
+            "snapshot_uri": snapshot_uri,
+            "is_async": is_async,
+        }
+        _CAM_CACHE[device_id] = ctx
+        return ctx
+
+def _evict_cam(device_id: str) -> None:
+    _CAM_CACHE.pop(device_id, None)
+
+async def _fetch_snapshot_http(snapshot_uri: str) -> tuple[bytes, str] | None:
+    """Fetch an already-encoded image from the camera's HTTP snapshot endpoint.
+
+    Returns (image bytes, mime type), or None so the caller can fall back to
+    the RTSP capture path.
+    """
+    auth = aiohttp.BasicAuth(ONVIF_USER, ONVIF_PASS) if ONVIF_USER and ONVIF_PASS else None
+    try:
+        async with _http_session().get(snapshot_uri, auth=auth) as resp:
+            if resp.status != 200:
+                return None
+            content_type = resp.headers.get("content-type", "").split(";")[0].strip()
+            if not content_type.startswith("image/"):
+                return None
+            return await resp.read(), content_type
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # Bare TimeoutError covers total-timeout expiry (not a ClientError);
+        # a stalled endpoint must fall back to RTSP, not evict the camera.
+        return None
+
+def _grab_snapshot_jpeg_cv(stream_uri: str) -> tuple[memoryview | None, str | None]:
+    """Blocking OpenCV snapshot capture; run via asyncio.to_thread.
+
+    Returns (jpeg bytes, None) on success or (None, error message) on failure.
+    """
+    cap = cv2.VideoCapture(stream_uri, cv2.CAP_FFMPEG)
+    if not cap.isOpened():
+        cap.release()
+        return None, "Error: Could not open camera stream with OpenCV."
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        return None, "Error: Failed to read a frame from the camera stream."
+
+    # JPEG encodes photographic frames far faster and smaller than PNG.
+    ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+    if not ok:
+        return None, "Error: Failed to encode the camera frame."
+    # Hand back a zero-copy view; base64 reads it via the buffer protocol.
+    return memoryview(buffer), None
+
+async def _grab_frame_jpeg(stream_uri: str) -> bytes | None:
+    """Grab a single JPEG frame from an RTSP stream via a one-shot ffmpeg run.
+
+    ffmpeg stops at the first decodable frame, skipping the extra frames an
+    OpenCV VideoCapture decodes and discards. Returns None when ffmpeg is
+    missing or fails, so the caller can fall back to OpenCV.
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-rtsp_transport", "tcp", "-i", stream_uri,
+            "-frames:v", "1", "-f", "image2pipe", "-vcodec", "mjpeg", "-",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        return None
+    jpeg, _ = await proc.communicate()
+    if proc.returncode == 0 and jpeg:
+        return jpeg
+    return None
+
 # --- In-memory device store ---
 _SMART_HOME_DEVICE_STORE: dict[str, SmartDevice] = {
     "lamp": SmartDevice(id="lamp", name="Desk Lamp", aliases=["desk lamp", "lamp"], type="light", capabilities=["on_off"]),
@@ -280,20 +583,147 @@ _SMART_HOME_DEVICE_STORE: dict[str, SmartDevice] = {
     "cam": SmartDevice(id="cam", name="Security Camera", aliases=["camera", "security cam"], type="camera", capabilities=["reboot", "get_status", "take_snapshot"]),
 }
 
+# --- Device lookup index ---
+# Every lowercased name/alias maps to its device id, matched in one pass via
+# an Aho-Corasick automaton (or one alternation regex when pyahocorasick is
+# not installed); rebuilt whenever the store mutates.
+_DEVICE_NAME_TO_ID: dict[str, str] = {}
+_DEVICE_RE: re.Pattern | None = None
+_DEVICE_AUTOMATON = None
+
+def _rebuild_device_index() -> None:
+    global _DEVICE_NAME_TO_ID, _DEVICE_RE, _DEVICE_AUTOMATON
+    index: dict[str, str] = {}
+    for dev in _SMART_HOME_DEVICE_STORE.values():
+        for name in [dev.name, *dev.aliases]:
+            index.setdefault(name.lower(), dev.id)
+    # Longest names first so "desk lamp" wins over a bare "lamp".
+    names = sorted(index, key=len, reverse=True)
+    _DEVICE_NAME_TO_ID = index
+    _DEVICE_RE = re.compile("|".join(map(re.escape, names))) if names else None
+    if ahocorasick is not None and names:
+        automaton = ahocorasick.Automaton()
+        for name, dev_id in index.items():
+            automaton.add_word(name, (len(name), dev_id))
+        automaton.make_automaton()
+        _DEVICE_AUTOMATON = automaton
+    else:
+        _DEVICE_AUTOMATON = None
+    # Cached parses embed device ids, so they go stale when the store changes.
+    _parse_cached.cache_clear()
+
+_rebuild_device_index()
+
 # --- Smart home discover tool ---
 SMART_HOME_DISCOVER_DESCRIPTION = RichToolDescription(
     description="Scan and list all connected smart home devices.",
     use_when="Use this tool when the user needs to see which devices are available and their capabilities before sending a command.",
     side_effects="None — only returns a list of devices and their details."
 )
+_SMART_HOME_DISCOVER_DESCRIPTION_JSON = SMART_HOME_DISCOVER_DESCRIPTION.dump()
 
-@mcp.tool(description=SMART_HOME_DISCOVER_DESCRIPTION.model_dump_json())
+@mcp.tool(description=_SMART_HOME_DISCOVER_DESCRIPTION_JSON)
 async def smart_home_discover() -> str:
     lines = ["Discovered devices:"]
     for d in _SMART_HOME_DEVICE_STORE.values():
         lines.append(f"- {d.id} | {d.name} | aliases={d.aliases} | type={d.type} | caps={d.capabilities} | online={d.online}")
     return "\n".join(lines)
 
+# --- Device command handlers ---
+async def _mock_turn_on(device: SmartDevice, req: SmartCommandRequest) -> str:
+    return f"OK: Mock {device.name} is now ON"
+
+async def _mock_turn_off(device: SmartDevice, req: SmartCommandRequest) -> str:
+    return f"OK: Mock {device.name} is now OFF"
+
+async def _mock_get_status(device: SmartDevice, req: SmartCommandRequest) -> str:
+    return f"OK: Mock {device.name} is {'online' if device.online else 'offline'}"
+
+async def _mock_set_temperature(device: SmartDevice, req: SmartCommandRequest) -> str:
+    temp = req.params.get("temperature")
+    if temp is None:
+        raise McpError(ErrorData(code=INVALID_PARAMS, message="Missing temperature"))
+    return f"OK: Mock {device.name} temperature set to {temp}°C"
+
+async def _camera_snapshot(device: SmartDevice, req: SmartCommandRequest, ctx: dict) -> Union[str, list[ImageContent]]:
+    # Prefer the HTTP snapshot endpoint: one GET of ready-made JPEG bytes,
+    # no RTSP session or re-encode.
+    if ctx["snapshot_uri"]:
+        snap = await _fetch_snapshot_http(ctx["snapshot_uri"])
+        if snap is not None:
+            image_bytes, mime_type = snap
+            return [ImageContent(type="image", mimeType=mime_type, data=_b64encode(image_bytes))]
+
+    jpeg = await _grab_frame_jpeg(ctx["stream_uri"])
+
+    if jpeg is None:
+        # ffmpeg unavailable or failed; fall back to OpenCV in a worker
+        # thread so the RTSP handshake doesn't stall the event loop.
+        jpeg, error = await asyncio.to_thread(_grab_snapshot_jpeg_cv, ctx["stream_uri"])
+        if jpeg is None:
+            return error
+
+    return [ImageContent(type="image", mimeType="image/jpeg", data=_b64encode(jpeg))]
+
+async def _camera_reboot(device: SmartDevice, req: SmartCommandRequest, ctx: dict) -> str:
+    devicemgmt = ctx["devmgmt"]
+    if not devicemgmt:
+        return "Error: Could not connect to the camera's management service."
+    await _onvif_result(ctx, devicemgmt.SystemReboot())
+    return "Success! The camera is now rebooting."
+
+async def _camera_get_status(device: SmartDevice, req: SmartCommandRequest, ctx: dict) -> str:
+    devicemgmt = ctx["devmgmt"]
+    if not devicemgmt:
+        return "Error: Could not connect to the camera's management service."
+    info = await _onvif_result(ctx, devicemgmt.GetDeviceInformation())
+    return f"Success! Camera is online. Model: {info.Model}, Firmware: {info.FirmwareVersion}."
+
+_CAMERA_HANDLERS = {
+    "take_snapshot": _camera_snapshot,
+    "reboot": _camera_reboot,
+    "turn_on": _camera_reboot,
+    "turn_off": _camera_reboot,
+    "get_status": _camera_get_status,
+}
+
+async def _camera_command(device: SmartDevice, req: SmartCommandRequest) -> Union[str, list[ImageContent]]:
+    if not all([CAMERA_IP, ONVIF_USER, ONVIF_PASS]):
+        return "Error: Camera credentials are not configured on the server."
+
+    # Reject unsupported commands before any ONVIF round-trip happens.
+    # turn_on/turn_off are accepted as aliases for reboot.
+    if req.command not in device.capabilities and req.command not in ("turn_on", "turn_off"):
+        return f"Error: The command '{req.command}' is not supported for the camera."
+
+    try:
+        print(f"[{datetime.datetime.now()}] DEBUG: Starting camera command '{req.command}'")
+        ctx = await _get_cam(device.id)
+        return await _CAMERA_HANDLERS[req.command](device, req, ctx)
+    except asyncio.TimeoutError:
+        _evict_cam(device.id)
+        return f"Error: Connection timed out to camera at {CAMERA_IP}."
+    except McpError:
+        _evict_cam(device.id)
+        raise
+    except Exception as e:
+        _evict_cam(device.id)
+        if "401" in str(e) or "Unauthorized" in str(e):
+            return "Error: Camera authentication failed. Please check credentials."
+        print(f"UNEXPECTED CAMERA ERROR: {e}")
+        return f"An unexpected camera error occurred: {e}"
+
+# Dispatch table keyed by (device type, command): one hash lookup replaces the
+# nested type/command branch ladder, and new device types just add entries.
+_HANDLERS: dict = {}
+for _dtype in ("light", "plug", "thermostat"):
+    _HANDLERS[(_dtype, "turn_on")] = _mock_turn_on
+    _HANDLERS[(_dtype, "turn_off")] = _mock_turn_off
+    _HANDLERS[(_dtype, "get_status")] = _mock_get_status
+    _HANDLERS[(_dtype, "set_temperature")] = _mock_set_temperature
+for _cmd in _CAMERA_HANDLERS:
+    _HANDLERS[("camera", _cmd)] = _camera_command
+
 # --- Smart home command tool  ---
 SMART_HOME_COMMAND_DESCRIPTION = RichToolDescription(
     description=(
@@ -306,8 +736,9 @@ SMART_HOME_COMMAND_DESCRIPTION = RichToolDescription(
         "or rebooting a camera. Camera snapshot commands will return an image."
     )
 )
+_SMART_HOME_COMMAND_DESCRIPTION_JSON = SMART_HOME_COMMAND_DESCRIPTION.dump()
 
-@mcp.tool(description=SMART_HOME_COMMAND_DESCRIPTION.model_dump_json())
+@mcp.tool(description=_SMART_HOME_COMMAND_DESCRIPTION_JSON)
 async def smart_home_command(
     command_text: Annotated[str, Field(description="Plain-language command like 'turn on desk lamp'")]
 ) -> Union[str, list[ImageContent]]:
@@ -330,84 +761,10 @@ async def smart_home_command(
     if not device:
         raise McpError(ErrorData(code=INVALID_PARAMS, message=f"Device {req.device_id} not found"))
 
-    # --- MOCK DEVICE LOGIC ---
-    if device.type in ["light", "plug", "thermostat"]:
-        if req.command == "turn_on":
-            return f"OK: Mock {device.name} is now ON"
-        if req.command == "turn_off":
-            return f"OK: Mock {device.name} is now OFF"
-        if req.command == "get_status":
-            return f"OK: Mock {device.name} is {'online' if device.online else 'offline'}"
-        if req.command == "set_temperature":
-            temp = req.params.get("temperature")
-            if temp is None:
-                raise McpError(ErrorData(code=INVALID_PARAMS, message="Missing temperature"))
-            return f"OK: Mock {device.name} temperature set to {temp}°C"
-
-    # --- REAL CAMERA LOGIC ---
-    if device.type == "camera":
-        if not all([CAMERA_IP, ONVIF_USER, ONVIF_PASS]):
-            return "Error: Camera credentials are not configured on the server."
-
-        try:
-            print(f"[{datetime.datetime.now()}] DEBUG: Starting camera command '{req.command}'")
-            mycam = ONVIFCamera(CAMERA_IP, ONVIF_PORT, ONVIF_USER, ONVIF_PASS)
-            await resolve_awaitable(mycam.update_xaddrs())
-
-            if req.command == "take_snapshot":
-                media_service = await resolve_awaitable(mycam.create_media_service())
-                profiles = await resolve_awaitable(media_service.GetProfiles())
-                if not profiles:
-                    return "Error: No media profiles available on camera."
-                token = profiles[0].token
-                uri_request = media_service.create_type('GetStreamUri')
-                uri_request.ProfileToken = token
-                uri_request.StreamSetup = {'Stream': 'RTP-Unicast', 'Transport': {'Protocol': 'RTSP'}}
-
-                uri_response = await resolve_awaitable(media_service.GetStreamUri(uri_request))
-                stream_uri = uri_response.Uri
-                if ONVIF_USER and ONVIF_PASS:
-                    # inject credentials into URI
-                    parts = stream_uri.split('://', 1)
-                    if len(parts) == 2:
-                        stream_uri = f"{parts[0]}://{ONVIF_USER}:{ONVIF_PASS}@{parts[1]}"
-
-                cap = cv2.VideoCapture(stream_uri)
-                if not cap.isOpened():
-                    return "Error: Could not open camera stream with OpenCV."
-
-                ret, frame = cap.read()
-                cap.release()
-                if not ret:
-                    return "Error: Failed to read a frame from the camera stream."
-
-                _, buffer = cv2.imencode('.png', frame)
-                img_base64 = base64.b64encode(buffer).decode('utf-8')
-                return [ImageContent(type="image", mimeType="image/png", data=img_base64)]
-
-            # --- Other camera commands ---
-            devicemgmt = await resolve_awaitable(mycam.create_devicemgmt_service())
-            if not devicemgmt:
-                return "Error: Could not connect to the camera's management service."
-
-            if req.command in ["reboot", "turn_on", "turn_off"]:
-                await resolve_awaitable(devicemgmt.SystemReboot())
-                return "Success! The camera is now rebooting."
-            elif req.command == "get_status":
-                info = await resolve_awaitable(devicemgmt.GetDeviceInformation())
-                return f"Success! Camera is online. Model: {info.Model}, Firmware: {info.FirmwareVersion}."
-            else:
-                return f"Error: The command '{req.command}' is not supported for the camera."
-
-        except asyncio.TimeoutError:
-            return f"Error: Connection timed out to camera at {CAMERA_IP}."
-        except Exception as e:
-            if "401" in str(e) or "Unauthorized" in str(e):
-                return "Error: Camera authentication failed. Please check credentials."
-            print(f"UNEXPECTED CAMERA ERROR: {e}")
-            return f"An unexpected camera error occurred: {e}"
-
-    raise McpError(ErrorData(code=INVALID_PARAMS, message=f"Unsupported command '{req.command}' for device type '{device.type}'"))
+    handler = _HANDLERS.get((device.type, req.command))
+    if handler is None:
+        raise McpError(ErrorData(code=INVALID_PARAMS, message=f"Unsupported command '{req.command}' for device type '{device.type}'"))
+    return await handler(device, req)
 
 # --- Smart home add device tool ---
 SMART_HOME_ADD_DEVICE_DESCRIPTION = RichToolDescription(
@@ -415,8 +772,9 @@ SMART_HOME_ADD_DEVICE_DESCRIPTION = RichToolDescription(
     use_when="Use this tool when you want to simulate a new smart device without using real hardware.",
     side_effects="Updates the in-memory device store, making the new device available for control."
 )
+_SMART_HOME_ADD_DEVICE_DESCRIPTION_JSON = SMART_HOME_ADD_DEVICE_DESCRIPTION.dump()
 
-@mcp.tool(description=SMART_HOME_ADD_DEVICE_DESCRIPTION.model_dump_json())
+@mcp.tool(description=_SMART_HOME_ADD_DEVICE_DESCRIPTION_JSON)
 async def smart_home_add_device(
     id: Annotated[str, Field(description="Unique device id e.g. dev-xyz")],
     name: Annotated[str, Field(description="Human friendly name")],
@@ -427,12 +785,47 @@ async def smart_home_add_device(
         raise McpError(ErrorData(code=INVALID_PARAMS, message="Device id already exists"))
     dev = SmartDevice(id=id, name=name, aliases=aliases or [], type=type, capabilities=["on_off"] if type != "thermostat" else ["set_temperature"])
     _SMART_HOME_DEVICE_STORE[id] = dev
+    _rebuild_device_index()
     return f"Added device {id} | {name}"
 
+# --- Camera prewarm ---
+# The event loop only holds a weak reference to tasks, so the prewarm task
+# must be pinned here or it can be garbage-collected mid-run.
+_PREWARM_TASK: asyncio.Task | None = None
+
+async def _prewarm_camera():
+    """Build the camera connection cache ahead of the first user command.
+
+    WSDL parsing and the ONVIF handshake cost hundreds of ms; doing them at
+    startup means the first snapshot does not pay that price.
+    """
+    if not all([CAMERA_IP, ONVIF_USER, ONVIF_PASS]):
+        return
+    for dev in _SMART_HOME_DEVICE_STORE.values():
+        if dev.type != "camera":
+            continue
+        try:
+            await _get_cam(dev.id)
+            print(f"Camera '{dev.id}' connection prewarmed")
+        except Exception as e:
+            print(f"Camera '{dev.id}' prewarm failed (will retry on first command): {e}")
+
 # --- Run MCP Server ---
 async def main():
+    global _PREWARM_TASK
     print("🚀 Starting MCP server on http://0.0.0.0:8086")
-    await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    _PREWARM_TASK = asyncio.create_task(_prewarm_camera())
+    try:
+        await mcp.run_async("streamable-http", host="0.0.0.0", port=8086)
+    finally:
+        await _close_http_session()
 
 if __name__ == "__main__":
+    # uvloop (libuv-based) dispatches socket I/O with far less Python-level
+    # overhead than the default loop; unavailable on Windows.
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())